@@ -1,23 +1,64 @@
 import os
+from dataclasses import dataclass
 
-class Config:
-    TEST_MODE = os.getenv("TEST", "false").lower() == "true"
 
-    if TEST_MODE:
-        GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID", os.getenv("GOOGLE_CLOUD_PROJECT", "mock-project-id"))
-        BUCKET_NAME = os.getenv("BUCKET_NAME", "mock-bucket")
-        AI_LOCATION = os.getenv("AI_LOCATION", "global")
-    else:
-        GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID", os.getenv("GOOGLE_CLOUD_PROJECT"))
-        BUCKET_NAME = os.getenv("BUCKET_NAME")
-        AI_LOCATION = "global"
+def _build_defaults():
+    """Read the environment exactly once and derive all settings from it."""
+    env = os.environ.copy()
+    test_mode = env.get("TEST", "false").lower() == "true"
+    cache_enabled = env.get("CACHE_ENABLED", "true").lower() == "true"
+    batch_mode = env.get("BATCH_MODE", "false").lower() == "true"
+    llm_cache_ttl_days = int(env.get("LLM_CACHE_TTL_DAYS", "7"))
+
+    if test_mode:
+        return {
+            "TEST_MODE": True,
+            "CACHE_ENABLED": cache_enabled,
+            "BATCH_MODE": batch_mode,
+            "LLM_CACHE_TTL_DAYS": llm_cache_ttl_days,
+            "GCP_PROJECT_ID": env.get("GCP_PROJECT_ID", env.get("GOOGLE_CLOUD_PROJECT", "mock-project-id")),
+            "BUCKET_NAME": env.get("BUCKET_NAME", "mock-bucket"),
+            "AI_LOCATION": env.get("AI_LOCATION", "global"),
+        }
+
+    return {
+        "TEST_MODE": False,
+        "CACHE_ENABLED": cache_enabled,
+        "BATCH_MODE": batch_mode,
+        "LLM_CACHE_TTL_DAYS": llm_cache_ttl_days,
+        "GCP_PROJECT_ID": env.get("GCP_PROJECT_ID", env.get("GOOGLE_CLOUD_PROJECT")),
+        "BUCKET_NAME": env.get("BUCKET_NAME"),
+        "AI_LOCATION": "global",
+    }
+
+
+_defaults = _build_defaults()
+
+
+@dataclass(slots=True)
+class _Config:
+    TEST_MODE: bool = _defaults["TEST_MODE"]
+    CACHE_ENABLED: bool = _defaults["CACHE_ENABLED"]
+    BATCH_MODE: bool = _defaults["BATCH_MODE"]
+    # How long cached LLM responses stay valid before a re-run re-bills them.
+    LLM_CACHE_TTL_DAYS: int = _defaults["LLM_CACHE_TTL_DAYS"]
+    GCP_PROJECT_ID: str = _defaults["GCP_PROJECT_ID"]
+    BUCKET_NAME: str = _defaults["BUCKET_NAME"]
+    AI_LOCATION: str = _defaults["AI_LOCATION"]
+
+    # Vertex AI specific
+    VERTEX_API_VERSION: str = "v1"
+
+    def __post_init__(self):
+        if self.TEST_MODE:
+            return
 
         missing_vars = []
-        if not GCP_PROJECT_ID:
+        if not self.GCP_PROJECT_ID:
             missing_vars.append("GCP_PROJECT_ID or GOOGLE_CLOUD_PROJECT")
-        if not BUCKET_NAME:
+        if not self.BUCKET_NAME:
             missing_vars.append("BUCKET_NAME")
-        if not AI_LOCATION:
+        if not self.AI_LOCATION:
             missing_vars.append("AI_LOCATION")
 
         if missing_vars:
@@ -26,5 +67,13 @@ class Config:
                 f"{', '.join(missing_vars)}"
             )
 
-    # Vertex AI specific
-    VERTEX_API_VERSION = "v1"
+
+# Singleton instance: the environment is snapshotted at import, so repeated
+# attribute access never goes back through os.getenv.
+Config = _Config()
+
+# Module-level aliases for settings read on hot paths; importing these binds
+# the value directly and skips the instance attribute lookup per access.
+GCP_PROJECT_ID = Config.GCP_PROJECT_ID
+BUCKET_NAME = Config.BUCKET_NAME
+AI_LOCATION = Config.AI_LOCATION
@@ -6,6 +6,9 @@ MODEL_SYNTHESIS = "gemini-3.1-pro-preview"
 # Budgets & Configs
 GROUNDING_THRESHOLD = 0.7
 MAX_CONCURRENT_REQUESTS = 10
+REQUESTS_PER_SECOND = 5
+TOKENS_PER_MINUTE = 4_000_000
+BATCH_POLL_INTERVAL_SECONDS = 30
 
 # File Paths
 PROMPT_CONFIG_PATH = "assets/json/prompt_config.json"
@@ -15,6 +18,7 @@ TECHNICAL_SCHEMA_PATH = "assets/json/technical_schema.json"
 PRICING_SCHEMA_PATH = "assets/json/pricing_schema.json"
 SYNTHESIS_SCHEMA_PATH = "assets/json/synthesis_schema.json"
 MANAGEMENT_SUMMARY_SCHEMA_PATH = "assets/json/management_summary_schema.json"
+DOMAIN_SUMMARY_SCHEMA_PATH = "assets/json/domain_summary_schema.json"
 OVERARCHING_SUMMARY_SCHEMA_PATH = "assets/json/overarching_summary_schema.json"
 SOVEREIGNTY_SCHEMA_PATH = "assets/json/sovereignty_schema.json"
 RESULT_SCHEMA_PATH = "assets/json/result_schema.json"
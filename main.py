@@ -1,18 +1,11 @@
 import argparse
 import logging
-import os
 import datetime
 import asyncio
 import sys
+from collections import defaultdict
 from config import Config
 from constants import MAX_CONCURRENT_REQUESTS
-from pipeline.cache import CacheManager
-from pipeline.discovery import ServiceMapper
-from pipeline.sovereignty_analyst import SovereigntyAnalyst
-from pipeline.analyzer import TechnicalAnalyst
-from pipeline.pricing_analyst import PricingAnalyst
-from pipeline.synthesizer import Synthesizer
-from pipeline.visualizer import DashboardGenerator
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -21,61 +14,71 @@ def format_service_name(csp, service_name):
     """Formats a service name for use in cache keys."""
     return f"{csp}_{service_name}".lower().replace(" ", "_")
 
-async def process_service_item(item, tech_analyst, pricing_analyst, synthesizer, csp_a, csp_b, cache, semaphore):
-    async with semaphore:
-        service_a = item["csp_a_service_name"]
-        service_b = item.get("csp_b_service_name")
+async def process_service_item(item, tech_analyst, pricing_analyst, synthesizer, csp_a, csp_b, cache, semaphore, service_pair_id=None):
+    service_a = item["csp_a_service_name"]
+    service_b = item.get("csp_b_service_name")
 
-        if not service_b:
-            logger.info(f"Skipping {service_a} (no match in {csp_b})")
-            return None
+    if not service_b:
+        logger.info(f"Skipping {service_a} (no match in {csp_b})")
+        return None
 
+    if service_pair_id is None:
+        # Callers can precompute this outside the async hot path.
         formatted_service_a = format_service_name(csp_a, service_a)
         formatted_service_b = format_service_name(csp_b, service_b)
         service_pair_id = f"{formatted_service_a}_vs_{formatted_service_b}"
 
-        logger.info(f"Processing: {service_pair_id}")
+    logger.info(f"Processing: {service_pair_id}")
+
+    # The semaphore rate-limits LLM calls only; cache reads and disk writes
+    # happen outside it so they don't serialize other waiters.
+
+    # One batched lookup for all three stages instead of three round-trips.
+    tech_key = f"technical_{service_pair_id}"
+    pricing_key = f"pricing_{service_pair_id}"
+    result_key = f"result_{service_pair_id}"
+    hits = cache.get_many([tech_key, pricing_key, result_key])
 
-        # Technical Analysis
-        tech_key = f"technical_{service_pair_id}"
-        tech_data = cache.get(tech_key)
-        if not tech_data:
+    # Technical Analysis
+    tech_data = hits.get(tech_key)
+    if not tech_data:
+        async with semaphore:
             tech_data = await tech_analyst.perform_analysis(csp_a, csp_b, item)
-            if tech_data:
-                tech_data["service_pair_id"] = service_pair_id
-                cache.set(tech_key, tech_data)
-            else:
-                logger.warning(f"Technical analysis failed for {service_pair_id}")
-                return None # Stop processing if analysis fails
+        if tech_data:
+            tech_data["service_pair_id"] = service_pair_id
+            cache.set_async(tech_key, tech_data)
+        else:
+            logger.warning(f"Technical analysis failed for {service_pair_id}")
+            return None # Stop processing if analysis fails
 
-        # Pricing Analysis
-        pricing_key = f"pricing_{service_pair_id}"
-        pricing_data = cache.get(pricing_key)
-        if not pricing_data:
+    # Pricing Analysis
+    pricing_data = hits.get(pricing_key)
+    if not pricing_data:
+        async with semaphore:
             pricing_data = await pricing_analyst.perform_analysis(csp_a, csp_b, item)
-            if pricing_data:
-                pricing_data["service_pair_id"] = service_pair_id
-                cache.set(pricing_key, pricing_data)
-            else:
-                logger.warning(f"Pricing analysis failed for {service_pair_id}")
-                return None
+        if pricing_data:
+            pricing_data["service_pair_id"] = service_pair_id
+            cache.set_async(pricing_key, pricing_data)
+        else:
+            logger.warning(f"Pricing analysis failed for {service_pair_id}")
+            return None
 
-        # Synthesis
-        result_key = f"result_{service_pair_id}"
-        result_json = cache.get(result_key)
-        if not result_json:
+    # Synthesis
+    result_json = hits.get(result_key)
+    if not result_json:
+        async with semaphore:
             result_json = await synthesizer.synthesize(service_pair_id, tech_data, pricing_data)
-            if result_json:
-                cache.set(result_key, result_json)
-            else:
-                logger.warning(f"Synthesis failed for {service_pair_id}")
-                return None
+        if result_json:
+            cache.set_async(result_key, result_json)
+        else:
+            logger.warning(f"Synthesis failed for {service_pair_id}")
+            return None
 
-        # Return combined result for visualization
-        return {
-            "map": item,
-            "result": result_json
-        }
+    # Return combined result for visualization
+    return {
+        "map": item,
+        "result": result_json
+    }
 
 async def main():
     parser = argparse.ArgumentParser(description="Cloud Service Provider Comparator Pipeline")
@@ -85,6 +88,16 @@ async def main():
     parser.add_argument("--clear-cache", action="store_true", help="Clear the cache before running")
     args = parser.parse_args()
 
+    # Imported lazily so `--help` (and argparse errors) don't pay for the
+    # Vertex SDK, Jinja and Markdown imports the pipeline pulls in.
+    from pipeline.cache import CacheManager, ensure_dir
+    from pipeline.discovery import ServiceMapper
+    from pipeline.sovereignty_analyst import SovereigntyAnalyst
+    from pipeline.analyzer import TechnicalAnalyst
+    from pipeline.pricing_analyst import PricingAnalyst
+    from pipeline.synthesizer import Synthesizer
+    from pipeline.visualizer import DashboardGenerator
+
     csp_a = args.csp_a
     csp_b = args.csp_b
     test_mode = args.test or Config.TEST_MODE
@@ -100,38 +113,32 @@ async def main():
 
     logger.info(f"Starting pipeline: {csp_a} vs {csp_b} (Test Mode: {test_mode})")
 
-    os.makedirs("public", exist_ok=True)
+    ensure_dir("public")
 
 
     # --- Phase 1: Discovery ---
     mapper = ServiceMapper()
 
-    # Step 1: Get service lists for each CSP
-    service_list_a_key = f"service_list_{csp_a}"
-    service_list_a = cache.get(service_list_a_key)
-    if service_list_a and not service_list_a.get("services"):
-        logger.warning(f"Cached service list for {csp_a} is empty. Ignoring.")
-        service_list_a = None
-
-    if not service_list_a:
-        service_list_a = await mapper.get_service_list(csp_a)
-        if service_list_a and service_list_a.get("services"):
-            cache.set(service_list_a_key, service_list_a)
-        else:
-            logger.error(f"Failed to retrieve service list for {csp_a}")
-
-    service_list_b_key = f"service_list_{csp_b}"
-    service_list_b = cache.get(service_list_b_key)
-    if service_list_b and not service_list_b.get("services"):
-        logger.warning(f"Cached service list for {csp_b} is empty. Ignoring.")
-        service_list_b = None
-
-    if not service_list_b:
-        service_list_b = await mapper.get_service_list(csp_b)
-        if service_list_b and service_list_b.get("services"):
-            cache.set(service_list_b_key, service_list_b)
-        else:
-            logger.error(f"Failed to retrieve service list for {csp_b}")
+    async def fetch_service_list(csp):
+        """Returns the cached service list for a CSP, fetching and caching it on a miss."""
+        key = f"service_list_{csp}"
+        service_list = cache.get(key)
+        if service_list and not service_list.get("services"):
+            logger.warning(f"Cached service list for {csp} is empty. Ignoring.")
+            service_list = None
+
+        if not service_list:
+            service_list = await mapper.get_service_list(csp)
+            if service_list and service_list.get("services"):
+                cache.set(key, service_list)
+            else:
+                logger.error(f"Failed to retrieve service list for {csp}")
+        return service_list
+
+    # Step 1: Get service lists for both CSPs concurrently (independent calls)
+    service_list_a, service_list_b = await asyncio.gather(
+        fetch_service_list(csp_a), fetch_service_list(csp_b)
+    )
 
     # Step 2: Map services between the two CSPs
     service_map_key = f"service_map_{csp_a}_{csp_b}"
@@ -145,7 +152,7 @@ async def main():
         if service_list_a and service_list_a.get("services") and service_list_b and service_list_b.get("services"):
             service_map = await mapper.map_services(csp_a, csp_b, service_list_a.get('services', []), service_list_b.get('services', []))
             if service_map and service_map.get("items"):
-                cache.set(service_map_key, service_map)
+                await asyncio.to_thread(cache.set, service_map_key, service_map)
             else:
                 logger.error("Service mapping failed or returned empty items.")
         else:
@@ -164,27 +171,28 @@ async def main():
     # --- Phase 1.5: Sovereignty Analysis ---
     sov_analyst = SovereigntyAnalyst()
 
-    # Sovereignty Analysis for CSP A
-    sov_a_key = f"sovereignty_{csp_a}"
-    sov_data_a = cache.get(sov_a_key)
-    if not sov_data_a:
-        logger.info(f"Performing sovereignty analysis for {csp_a}...")
-        sov_data_a = await sov_analyst.perform_analysis(csp_a)
-        if sov_data_a:
-            cache.set(sov_a_key, sov_data_a)
-        else:
-            logger.warning(f"Sovereignty analysis failed for {csp_a}")
-
-    # Sovereignty Analysis for CSP B
-    sov_b_key = f"sovereignty_{csp_b}"
-    sov_data_b = cache.get(sov_b_key)
-    if not sov_data_b:
-        logger.info(f"Performing sovereignty analysis for {csp_b}...")
-        sov_data_b = await sov_analyst.perform_analysis(csp_b)
-        if sov_data_b:
-            cache.set(sov_b_key, sov_data_b)
+    sov_keys = {csp: f"sovereignty_{csp}" for csp in (csp_a, csp_b)}
+    sov_data = {csp: cache.get(key) for csp, key in sov_keys.items()}
+    missing = [csp for csp, data in sov_data.items() if not data]
+
+    if missing:
+        logger.info(f"Performing sovereignty analysis for {', '.join(missing)}...")
+        if Config.BATCH_MODE:
+            # Both analyses ride one batch-prediction job in offline runs.
+            fresh = await sov_analyst.perform_analysis_batch(missing)
         else:
-            logger.warning(f"Sovereignty analysis failed for {csp_b}")
+            fresh = dict(zip(missing, await asyncio.gather(
+                *(sov_analyst.perform_analysis(csp) for csp in missing)
+            )))
+        for csp, data in fresh.items():
+            if data:
+                cache.set(sov_keys[csp], data)
+                sov_data[csp] = data
+            else:
+                logger.warning(f"Sovereignty analysis failed for {csp}")
+
+    sov_data_a = sov_data[csp_a]
+    sov_data_b = sov_data[csp_b]
 
     # --- Phase 2, 3, 4: Analysis, Pricing, Synthesis ---
     tech_analyst = TechnicalAnalyst()
@@ -192,22 +200,51 @@ async def main():
     synthesizer = Synthesizer()
     semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 
-    tasks = []
+    # Stream items through a bounded queue instead of materializing one
+    # coroutine (and its cached payloads) per item up front. Peak memory is
+    # O(concurrency) rather than O(len(items)).
+    queue = asyncio.Queue(maxsize=MAX_CONCURRENT_REQUESTS * 2)
+    final_results = []
+    # The dashboard template aggregates over the whole result set (domain
+    # averages, radar charts), so results cannot be flushed to HTML one at a
+    # time. The Phase 5 grouping, however, is consumed incrementally here as
+    # each item completes instead of in a separate pass afterwards.
+    synthesis_by_domain = defaultdict(list)
+
+    async def worker():
+        while True:
+            item, service_pair_id = await queue.get()
+            try:
+                result = await process_service_item(item, tech_analyst, pricing_analyst, synthesizer, csp_a, csp_b, cache, semaphore, service_pair_id=service_pair_id)
+                if result is not None:
+                    final_results.append(result)
+                    synthesis_by_domain[result["map"].get("domain", "Uncategorized")].append(result["result"]["synthesis"])
+            except Exception:
+                # An escaping exception would kill this worker silently (the
+                # final gather swallows it) and, with enough dead workers,
+                # deadlock the bounded queue. Log it loudly and keep serving.
+                logger.exception(f"Unexpected error processing {service_pair_id or item.get('csp_a_service_name')}")
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(MAX_CONCURRENT_REQUESTS)]
     for item in items:
-        tasks.append(process_service_item(item, tech_analyst, pricing_analyst, synthesizer, csp_a, csp_b, cache, semaphore))
-
-    processed_results = await asyncio.gather(*tasks)
-
-    final_results = [res for res in processed_results if res is not None]
+        # Precompute the pair id here so the string work stays out of the
+        # semaphore-gated coroutines.
+        service_b = item.get("csp_b_service_name")
+        service_pair_id = (
+            f"{format_service_name(csp_a, item['csp_a_service_name'])}_vs_{format_service_name(csp_b, service_b)}"
+            if service_b
+            else None
+        )
+        await queue.put((item, service_pair_id))
+    await queue.join()
+    for w in workers:
+        w.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
 
     # --- Phase 5: Management Summary ---
-    # Group results by domain for the new summary generation
-    synthesis_by_domain = {}
-    for item in final_results:
-        domain = item["map"].get("domain", "Uncategorized")
-        if domain not in synthesis_by_domain:
-            synthesis_by_domain[domain] = []
-        synthesis_by_domain[domain].append(item["result"]["synthesis"])
+    # synthesis_by_domain was populated incrementally by the workers above.
 
     # Generate the consolidated management summary
     suffix = "_test" if test_mode else ""
@@ -215,9 +252,12 @@ async def main():
     management_summary = cache.get(management_summary_key)
 
     if not management_summary:
-        management_summary = await synthesizer.generate_management_summary(
-            synthesis_by_domain
-        )
+        # Reuse the pipeline-wide semaphore so the summary call counts
+        # against the same LLM concurrency budget as the per-item fan-out.
+        async with semaphore:
+            management_summary = await synthesizer.generate_management_summary(
+                synthesis_by_domain
+            )
         if management_summary:
             cache.set(management_summary_key, management_summary)
         else:
@@ -240,9 +280,19 @@ async def main():
         sov_data_b
     )
 
+    await cache.aclose()
+
     logger.info("Pipeline completed successfully.")
 
 if __name__ == "__main__":
+    # libuv-based loop: drop-in scheduler speedup for the LLM fan-out, which
+    # is pure awaited I/O. Optional — the stdlib loop is used where uvloop
+    # is unavailable (e.g. Windows).
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     try:
         asyncio.run(main())
     except ValueError as e:
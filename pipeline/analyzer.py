@@ -1,26 +1,59 @@
-import json
 import logging
 from config import Config
 from constants import MODEL_ANALYSIS, PROMPT_CONFIG_PATH, TECHNICAL_SCHEMA_PATH
-from pipeline.gemini import GeminiClient
+from pipeline.assets import compile_template, load_json
+from pipeline.coalesce import RequestCoalescer
+from pipeline.gemini import get_gemini_client
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Static body of the TEST_MODE response, built once at import; only the
+# service_pair_id varies per call.
+_MOCK_ANALYSIS = {
+    "maturity_analysis": {
+        "csp_a": {"stability": "High", "release_stage": "GA", "feature_completeness": "High"},
+        "csp_b": {"stability": "High", "release_stage": "GA", "feature_completeness": "High"}
+    },
+    "integration_quality": {
+        "api_consistency": "Good", "documentation_quality": "Excellent", "sdk_support": "Broad"
+    },
+    "technical_score": 9.5,
+    "technical_reasoning": "<p>This is a mock reasoning.</p>",
+    "lockin_analysis": {
+        "lockin_score": 5,
+        "lockin_reasoning": "<p>This is a mock lock-in reasoning.</p>"
+    }
+}
+
 class TechnicalAnalyst:
     def __init__(self):
-        self.client = GeminiClient()
+        self.client = get_gemini_client()
         self.model_name = MODEL_ANALYSIS
+        self._coalescer = RequestCoalescer()
         self._load_assets()
 
     def _load_assets(self):
-        with open(PROMPT_CONFIG_PATH, 'r') as f:
-            self.prompts = json.load(f)
+        self.prompts = load_json(PROMPT_CONFIG_PATH)
+        self.schema = load_json(TECHNICAL_SCHEMA_PATH)
+
+        # Resolved once so the hot path only formats the template.
+        prompt_config = self.prompts.get("technical_prompt", {})
+        self.system_instruction = prompt_config.get("system_instruction")
+        self._render_user = compile_template(prompt_config.get("user_template", ""))
 
-        with open(TECHNICAL_SCHEMA_PATH, 'r') as f:
-            self.schema = json.load(f)
+    async def perform_analysis(self, csp_a: str, csp_b: str, service_pair: dict, enable_grounding: bool = False) -> dict:
+        # Concurrent duplicates of the same pair share a single in-flight call.
+        # The per-call knobs are part of the key so a grounded request never
+        # receives the result of an overlapping non-grounded one.
+        # Grounding is opt-in: the catalog URLs are already in the prompt, and
+        # the extra search round-trip roughly doubles latency per pair. Set it
+        # True only for novel services the model is unlikely to know.
+        key = f"{csp_a}_{service_pair.get('csp_a_service_name')}_vs_{csp_b}_{service_pair.get('csp_b_service_name')}_g{int(enable_grounding)}"
+        return await self._coalescer.run(
+            key, lambda: self._perform_analysis(csp_a, csp_b, service_pair, enable_grounding)
+        )
 
-    async def perform_analysis(self, csp_a: str, csp_b: str, service_pair: dict) -> dict:
+    async def _perform_analysis(self, csp_a: str, csp_b: str, service_pair: dict, enable_grounding: bool = False) -> dict:
         service_a_name = service_pair.get("csp_a_service_name")
         service_a_url = service_pair.get("csp_a_url")
         service_b_name = service_pair.get("csp_b_service_name")
@@ -32,26 +65,10 @@ class TechnicalAnalyst:
 
         if Config.TEST_MODE:
             logger.info(f"TEST_MODE enabled for TechnicalAnalyst. Returning mock data for {service_a_name} vs {service_b_name}")
-            return {
-                "service_pair_id": f"{service_a_name}_vs_{service_b_name}",
-                "maturity_analysis": {
-                    "csp_a": {"stability": "High", "release_stage": "GA", "feature_completeness": "High"},
-                    "csp_b": {"stability": "High", "release_stage": "GA", "feature_completeness": "High"}
-                },
-                "integration_quality": {
-                    "api_consistency": "Good", "documentation_quality": "Excellent", "sdk_support": "Broad"
-                },
-                "technical_score": 9.5,
-                "technical_reasoning": "<p>This is a mock reasoning.</p>",
-                "lockin_analysis": {
-                    "lockin_score": 5,
-                    "lockin_reasoning": "<p>This is a mock lock-in reasoning.</p>"
-                }
-            }
+            return {"service_pair_id": f"{service_a_name}_vs_{service_b_name}", **_MOCK_ANALYSIS}
 
-        prompt_config = self.prompts["technical_prompt"]
-        system_instruction = prompt_config["system_instruction"]
-        user_content = prompt_config["user_template"].format(
+        system_instruction = self.system_instruction
+        user_content = self._render_user(
             csp_a=csp_a,
             service_a_name=service_a_name,
             service_a_url=service_a_url,
@@ -60,12 +77,22 @@ class TechnicalAnalyst:
             service_b_url=service_b_url
         )
 
+        # Well-known mappings (both catalog URLs resolved by the mapper) are
+        # templated comparisons; skip reasoning tokens for those and keep
+        # thinking for the novel or ambiguous pairs.
+        enable_thinking = not (service_a_url and service_b_url)
+
+        # Response caching happens inside GeminiClient.generate_content,
+        # where CACHE_ENABLED and LLM_CACHE_TTL_DAYS are honored for every
+        # analyst uniformly.
         try:
             response = await self.client.generate_content(
                 model_name=self.model_name,
                 user_content=user_content,
                 system_instruction=system_instruction,
-                schema=self.schema
+                schema=self.schema,
+                enable_grounding=enable_grounding,
+                enable_thinking=enable_thinking
             )
             if response is None:
                 logger.error(f"Received None response from GeminiClient for {service_a_name} vs {service_b_name}")
@@ -0,0 +1,71 @@
+import functools
+import mmap
+import os
+import string
+
+import orjson
+
+
+@functools.lru_cache(maxsize=None)
+def load_json(path):
+    """Loads and parses a JSON asset once per process.
+
+    Prompt configs and schemas are shared between analysts; repeat
+    instantiations get the already-parsed object instead of re-reading
+    the file.
+    """
+    with open(path, 'r') as f:
+        # One read, then orjson for the parse — the cold-start constructors
+        # run on the event-loop thread, so the shorter the blocking read the
+        # better; memoization keeps it to once per process either way.
+        return orjson.loads(f.read())
+
+
+def load_data_file(path):
+    """Loads a large JSON data file (e.g. a CSP service list) quickly.
+
+    Maps the file into memory and parses it with orjson, memoized on the
+    file's mtime so a hot pipeline never re-reads an unchanged catalog.
+    """
+    return _load_data_file(path, os.path.getmtime(path))
+
+
+@functools.lru_cache(maxsize=8)
+def _load_data_file(path, mtime):
+    with open(path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    return orjson.loads(view)
+                finally:
+                    view.release()
+        except (ValueError, OSError, TypeError):
+            # Empty files or exotic filesystems that refuse mmap.
+            return orjson.loads(f.read())
+
+
+def compile_template(template):
+    """Pre-parses a ``str.format`` template into literal and field segments.
+
+    Returns a renderer taking the field values as keyword arguments, so the
+    format string is parsed once per process instead of on every call.
+    """
+    segments = [
+        (literal, field)
+        for literal, field, _spec, _conversion in string.Formatter().parse(template)
+    ]
+
+    def render(**kwargs):
+        parts = []
+        for literal, field in segments:
+            if literal:
+                parts.append(literal)
+            if field is not None:
+                value = kwargs[field]
+                # Field values are almost always the pre-serialized strings;
+                # skip the redundant str() copy for those.
+                parts.append(value if type(value) is str else str(value))
+        return "".join(parts)
+
+    return render
@@ -1,43 +1,97 @@
+import asyncio
+import functools
+from collections import OrderedDict
+import hashlib
 import json
 import logging
 import os
 import time
-import shutil
+
+import orjson
 
 logger = logging.getLogger(__name__)
 
+_SECONDS_PER_DAY = 86400
+
+
+@functools.lru_cache(maxsize=None)
+def ensure_dir(path):
+    """Creates a directory once per process; repeat calls are dict lookups."""
+    os.makedirs(path, exist_ok=True)
+
 class CacheManager:
+    # How many queued writes the background flusher drains per wake-up.
+    FLUSH_BATCH_SIZE = 64
+
+    # Entries kept in the in-process LRU in front of the disk store.
+    MEM_MAX_ENTRIES = 512
+
     def __init__(self, cache_dir="data", max_age_days=7):
         self.cache_dir = cache_dir
-        self.max_age_seconds = max_age_days * 24 * 60 * 60
-        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_age_seconds = max_age_days * _SECONDS_PER_DAY
+        self._write_queue = None
+        self._flusher = None
+        self._mem = OrderedDict()
+        ensure_dir(self.cache_dir)
 
     def _get_filepath(self, key):
         return os.path.join(self.cache_dir, f"{key}.json")
 
+    def _mem_put(self, key, data):
+        self._mem[key] = (time.time(), data)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.MEM_MAX_ENTRIES:
+            self._mem.popitem(last=False)
+
     def get(self, key):
+        # Repeated reads of the same key during fan-out skip the two stat
+        # syscalls and the JSON parse entirely.
+        entry = self._mem.get(key)
+        if entry is not None:
+            stored_at, data = entry
+            if time.time() - stored_at < self.max_age_seconds:
+                self._mem.move_to_end(key)
+                return data
+            del self._mem[key]
+
         filepath = self._get_filepath(key)
-        if not os.path.exists(filepath):
+        try:
+            # One stat covers both the existence and the freshness check.
+            stat_result = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Failed to stat cache file {filepath}: {e}")
             return None
 
-        try:
-            file_age = time.time() - os.path.getmtime(filepath)
-            if file_age > self.max_age_seconds:
-                logger.info(f"Cache expired for {key} (Age: {file_age/86400:.1f} days)")
-                return None
+        file_age = time.time() - stat_result.st_mtime
+        if file_age > self.max_age_seconds:
+            logger.info(f"Cache expired for {key} (Age: {file_age/86400:.1f} days)")
+            return None
 
+        try:
             with open(filepath, "r") as f:
-                data = json.load(f)
+                data = orjson.loads(f.read())
                 # Inline validation check
                 if data is None or (isinstance(data, (list, dict)) and not data):
                     logger.warning(f"Invalid cached data found for {key}, ignoring.")
                     return None
                 logger.info(f"Using cached data for {key}")
+                self._mem_put(key, data)
                 return data
         except (json.JSONDecodeError, OSError) as e:
             logger.warning(f"Failed to load cache from {filepath}: {e}")
             return None
 
+    def get_many(self, keys):
+        """Batched lookup: returns a dict containing only the keys that hit."""
+        hits = {}
+        for key in keys:
+            data = self.get(key)
+            if data is not None:
+                hits[key] = data
+        return hits
+
     def set(self, key, data):
         # Inline validation check
         if data is None or (isinstance(data, (list, dict)) and not data):
@@ -45,14 +99,131 @@ class CacheManager:
             return
 
         filepath = self._get_filepath(key)
+        tmp_path = filepath + ".tmp"
         try:
-            with open(filepath, "w") as f:
-                json.dump(data, f, indent=2)
+            # Serialize once in memory so the file is written in a single call
+            # instead of the many small writes json.dump issues. Writing to a
+            # sidecar and renaming keeps the entry atomic: a crash mid-write
+            # can never leave a half-written file under the real key.
+            payload = orjson.dumps(data)
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, filepath)
+            self._mem_put(key, data)
             logger.info(f"Cached data for {key}")
         except OSError as e:
             logger.error(f"Failed to write cache to {filepath}: {e}")
 
+    def _llm_key(self, key_payload):
+        digest = hashlib.sha256(
+            orjson.dumps(key_payload, option=orjson.OPT_SORT_KEYS)
+        ).hexdigest()
+        return f"llm_{digest}"
+
+    def get_llm(self, key_payload):
+        """Looks up a cached LLM response by exact request payload."""
+        return self.get(self._llm_key(key_payload))
+
+    def set_llm(self, key_payload, response):
+        """Stores an LLM response keyed by the exact request payload."""
+        self.set(self._llm_key(key_payload), response)
+
+    def _get_jsonl_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.jsonl")
+
+    def append_jsonl(self, key, rows):
+        """Appends rows to a JSONL journal, one object per line."""
+        if not rows:
+            return
+        path = self._get_jsonl_path(key)
+        try:
+            with open(path, "ab") as f:
+                f.write(b"\n".join(orjson.dumps(row) for row in rows) + b"\n")
+        except OSError as e:
+            logger.error(f"Failed to append to journal {path}: {e}")
+
+    def read_jsonl(self, key):
+        """Returns all journal rows, or [] when absent or past max age."""
+        path = self._get_jsonl_path(key)
+        try:
+            if time.time() - os.stat(path).st_mtime > self.max_age_seconds:
+                return []
+            with open(path, "rb") as f:
+                return [orjson.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Failed to read journal {path}: {e}")
+            return []
+
+    def delete_jsonl(self, key):
+        """Removes a journal once the run it covered has completed."""
+        try:
+            os.unlink(self._get_jsonl_path(key))
+        except OSError:
+            pass
+
+    def set_async(self, key, data):
+        """Queues a write for the background flusher instead of blocking the caller.
+
+        Falls back to a synchronous write when no event loop is running.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.set(key, data)
+            return
+
+        if self._flusher is None or self._flusher.done():
+            self._write_queue = asyncio.Queue()
+            self._flusher = asyncio.create_task(self._flush_loop())
+        self._write_queue.put_nowait((key, data))
+
+    async def _flush_loop(self):
+        while True:
+            batch = [await self._write_queue.get()]
+            while len(batch) < self.FLUSH_BATCH_SIZE:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                # orjson.dumps of large result dicts is CPU work; run the
+                # whole batch in a thread so the event loop keeps turning.
+                await asyncio.to_thread(self.set_many, batch)
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+
+    def set_many(self, items):
+        """Writes a batch of (key, data) pairs in a single pass."""
+        for key, data in items:
+            self.set(key, data)
+
+    async def aclose(self):
+        """Flushes any pending writes and stops the background flusher."""
+        if self._flusher is None:
+            return
+        await self._write_queue.join()
+        self._flusher.cancel()
+        try:
+            await self._flusher
+        except asyncio.CancelledError:
+            pass
+        self._flusher = None
+        self._write_queue = None
+
     def clear(self):
-        if os.path.exists(self.cache_dir):
-            shutil.rmtree(self.cache_dir)
-            os.makedirs(self.cache_dir, exist_ok=True)
+        # Unlink entries individually instead of rmtree + mkdir: the directory
+        # inode stays valid for concurrent readers and non-cache files survive.
+        self._mem.clear()
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith((".json", ".jsonl")):
+                        try:
+                            os.unlink(entry.path)
+                        except OSError:
+                            pass
+        except FileNotFoundError:
+            pass
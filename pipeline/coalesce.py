@@ -0,0 +1,23 @@
+import asyncio
+
+
+class RequestCoalescer:
+    """Deduplicates identical in-flight async calls.
+
+    A caller asking for a key while an earlier call for the same key is
+    still running awaits the same task instead of issuing a duplicate
+    request. Completed results are not retained here; persisting them is
+    CacheManager's job.
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    async def run(self, key, coro_factory):
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # Shield so one caller being cancelled doesn't cancel the shared call.
+        return await asyncio.shield(task)
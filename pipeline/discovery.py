@@ -1,29 +1,138 @@
 import asyncio
-import json
+import functools
+import hashlib
 import logging
 import os
+from collections import Counter
+
+import orjson
 from config import Config
 from constants import MAX_CONCURRENT_REQUESTS, MODEL_DISCOVERY, PROMPT_CONFIG_PATH, SERVICE_LIST_SCHEMA_PATH, SERVICE_MAP_BATCH_SCHEMA_PATH
+from pipeline.assets import compile_template, load_data_file, load_json
+from pipeline.cache import CacheManager
 from pipeline.gemini import GeminiClient
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Services mapped per LLM call; amortizes the prompt overhead across the batch.
+BATCH_SIZE = 20
+
+# TEST_MODE fixtures, built once at import so the tight test loops return a
+# shared object instead of reallocating the nested dicts per call.
+_MOCK_SERVICE_LISTS = {
+    "AWS": {
+        "services": [
+            {"service_name": "EC2", "service_url": "https://aws.amazon.com/ec2/", "description": "Virtual Servers in the Cloud"},
+            {"service_name": "S3", "service_url": "https://aws.amazon.com/s3/", "description": "Object Storage Built to Store and Retrieve Any Amount of Data from Anywhere"},
+            {"service_name": "RDS", "service_url": "https://aws.amazon.com/rds/", "description": "Managed Relational Database Service for MySQL, PostgreSQL, Oracle, SQL Server, and MariaDB"}
+        ]
+    },
+    "GCP": {
+        "services": [
+            {"service_name": "Compute Engine", "service_url": "https://cloud.google.com/compute/", "description": "Virtual Machines Running in Google's Data Center"},
+            {"service_name": "Cloud Storage", "service_url": "https://cloud.google.com/storage/", "description": "Object Storage for Companies of All Sizes"},
+            {"service_name": "Virtual Private Cloud", "service_url": "https://cloud.google.com/vpc/", "description": "Managed Networking for Your Google Cloud Resources"}
+        ]
+    }
+}
+
+_MOCK_MAPPING = {
+    "items": [
+        {
+            "domain": "Compute",
+            "csp_a_service_name": "EC2",
+            "csp_a_url": "https://aws.amazon.com/ec2/",
+            "csp_b_service_name": "Compute Engine",
+            "csp_b_url": "https://cloud.google.com/compute/"
+        },
+        {
+            "domain": "Storage",
+            "csp_a_service_name": "S3",
+            "csp_a_url": "https://aws.amazon.com/s3/",
+            "csp_b_service_name": "Cloud Storage",
+            "csp_b_url": "https://cloud.google.com/storage/"
+        },
+        {
+            "domain": "Database",
+            "csp_a_service_name": "RDS",
+            "csp_a_url": "https://aws.amazon.com/rds/",
+            "csp_b_service_name": ""
+        },
+        {
+            "domain": "Networking",
+            "csp_a_service_name": "VPC",
+            "csp_a_url": "https://aws.amazon.com/vpc/",
+            "csp_b_service_name": "Virtual Private Cloud",
+            "csp_b_url": "https://cloud.google.com/vpc/"
+        }
+    ]
+}
+
+def _slim_chunk_json(chunk: list) -> str:
+    """Serializes a source chunk down to the fields the prompt describes.
+
+    Upstream catalogs carry descriptions and other metadata the mapping
+    prompt never uses; projecting to name/URL/domain before serializing
+    keeps the prefill a fraction of the size.
+    """
+    return orjson.dumps([
+        {"n": s.get("service_name"), "u": s.get("service_url"), "d": s.get("domain")}
+        for s in chunk
+    ]).decode()
+
+
+@functools.lru_cache(maxsize=64)
+def _slim_services_json(frozen: tuple) -> str:
+    """Serializes a frozen (name, url) tuple of services once per catalog.
+
+    The same target list is mapped against every source chunk — and, with
+    map_many, against several source CSPs — so memoizing on the hashable
+    form avoids re-serializing a large catalog per call.
+    """
+    return orjson.dumps([{"n": name, "u": url} for name, url in frozen]).decode()
+
+
+def _fallback_mapping(service_a: dict) -> dict:
+    """Placeholder mapping recorded when a batch fails for a service."""
+    return {
+        "domain": service_a.get("domain", "Unknown"),
+        "csp_a_service_name": service_a.get("service_name", "Unknown Service"),
+        "csp_a_url": service_a.get("service_url", ""),
+        "csp_b_service_name": None,
+        "csp_b_url": None
+    }
+
 class ServiceMapper:
+    # Fixed attribute layout: no per-instance __dict__, and typos on
+    # assignment fail loudly instead of creating stray attributes.
+    __slots__ = (
+        "client",
+        "model_name",
+        "response_cache",
+        "prompts",
+        "service_list_schema",
+        "batch_schema",
+        "system_instruction",
+        "user_template",
+        "_render_user",
+    )
+
     def __init__(self):
         self.client = GeminiClient()
         self.model_name = MODEL_DISCOVERY
+        self.response_cache = CacheManager()
         self._load_assets()
 
     def _load_assets(self):
-        with open(PROMPT_CONFIG_PATH, 'r') as f:
-            self.prompts = json.load(f)
-
-        with open(SERVICE_LIST_SCHEMA_PATH, 'r') as f:
-            self.service_list_schema = json.load(f)
+        self.prompts = load_json(PROMPT_CONFIG_PATH)
+        self.service_list_schema = load_json(SERVICE_LIST_SCHEMA_PATH)
+        self.batch_schema = load_json(SERVICE_MAP_BATCH_SCHEMA_PATH)
 
-        with open(SERVICE_MAP_BATCH_SCHEMA_PATH, 'r') as f:
-            self.batch_schema = json.load(f)
+        # Resolved once so the hot path only formats the template.
+        prompt_config = self.prompts.get("service_map_batch_prompt", {})
+        self.system_instruction = prompt_config.get("system_instruction")
+        self.user_template = prompt_config.get("user_template")
+        self._render_user = compile_template(self.user_template) if self.user_template else None
 
     async def get_service_list(self, csp: str) -> dict:
         """
@@ -32,30 +141,14 @@ class ServiceMapper:
 
         if Config.TEST_MODE:
             logger.info(f"TEST_MODE enabled for ServiceMapper. Returning mock service list for {csp}.")
-            if csp == "AWS":
-                return {
-                    "services": [
-                        {"service_name": "EC2", "service_url": "https://aws.amazon.com/ec2/", "description": "Virtual Servers in the Cloud"},
-                        {"service_name": "S3", "service_url": "https://aws.amazon.com/s3/", "description": "Object Storage Built to Store and Retrieve Any Amount of Data from Anywhere"},
-                        {"service_name": "RDS", "service_url": "https://aws.amazon.com/rds/", "description": "Managed Relational Database Service for MySQL, PostgreSQL, Oracle, SQL Server, and MariaDB"}
-                    ]
-                }
-            else:
-                 return {
-                    "services": [
-                        {"service_name": "Compute Engine", "service_url": "https://cloud.google.com/compute/", "description": "Virtual Machines Running in Google's Data Center"},
-                        {"service_name": "Cloud Storage", "service_url": "https://cloud.google.com/storage/", "description": "Object Storage for Companies of All Sizes"},
-                        {"service_name": "Virtual Private Cloud", "service_url": "https://cloud.google.com/vpc/", "description": "Managed Networking for Your Google Cloud Resources"}
-                    ]
-                }
+            return _MOCK_SERVICE_LISTS.get(csp, _MOCK_SERVICE_LISTS["GCP"])
 
         # Check for local file override first
         file_path = f"assets/json/hyperscaler/service_list_{csp}.json"
         if os.path.exists(file_path):
             logger.info(f"Loading service list for {csp} from local file: {file_path}")
             try:
-                with open(file_path, 'r') as f:
-                    return json.load(f)
+                return load_data_file(file_path)
             except Exception as e:
                 logger.error(f"Error loading local service list for {csp}: {e}")
                 return {"services": []}
@@ -63,108 +156,269 @@ class ServiceMapper:
             logger.error(f"Local service list file not found for {csp}: {file_path}")
             return {"services": []}
 
-    async def _map_batch_services(self, services_a_chunk: list, services_b: list, csp_a: str, csp_b: str, semaphore: asyncio.Semaphore) -> list:
+    async def get_service_lists(self, csp_a: str, csp_b: str) -> tuple:
         """
-        Finds best matches for a chunk of services from CSP A against services from CSP B.
+        Fetches the service lists for both CSPs concurrently; the pair
+        completes in the time of the slower fetch instead of their sum.
         """
-        def get_fallback(service_a):
-             return {
-                    "domain": service_a.get("domain", "Unknown"),
-                    "csp_a_service_name": service_a.get("service_name", "Unknown Service"),
-                    "csp_a_url": service_a.get("service_url", ""),
-                    "csp_b_service_name": None,
-                    "csp_b_url": None
-                }
+        return tuple(await asyncio.gather(
+            self.get_service_list(csp_a),
+            self.get_service_list(csp_b),
+        ))
 
+    def _mapping_key(self, csp_a: str, csp_b: str, service: dict) -> str:
+        """
+        Cache key for a single service mapping, normalized on name+description
+        so near-identical entries (e.g. the same service with a changed URL)
+        still hit.
+        """
+        identity = f"{service.get('service_name', '')} {service.get('description', '')}".lower().strip()
+        digest = hashlib.sha256(identity.encode()).hexdigest()
+        return f"mapping_{csp_a}_{csp_b}_{digest}".lower()
+
+    async def _map_batch_services(self, services_a_chunk: list, services_b_json: str, csp_a: str, csp_b: str, semaphore: asyncio.Semaphore) -> list:
+        """
+        Finds best matches for a chunk of services from CSP A against services from CSP B.
+        """
         async with semaphore:
             logger.info(f"Mapping batch of {len(services_a_chunk)} services from {csp_a} to {csp_b}")
 
-            prompt_config = self.prompts.get("service_map_batch_prompt", {})
-            system_instruction = prompt_config.get("system_instruction")
-            user_template = prompt_config.get("user_template")
+            system_instruction = self.system_instruction
+            user_template = self.user_template
 
             if not all([system_instruction, user_template]):
                 logger.error("Missing prompt configuration for batch service mapping.")
-                return [get_fallback(s) for s in services_a_chunk]
+                return [_fallback_mapping(s) for s in services_a_chunk]
 
-            user_content = user_template.format(
+            user_content = self._render_user(
                 csp_a=csp_a,
                 csp_b=csp_b,
-                services_a=json.dumps(services_a_chunk),
-                services_b=json.dumps(services_b)
+                services_a=_slim_chunk_json(services_a_chunk),
+                services_b=services_b_json
             )
 
+            # Identical batches across re-runs are served by the response
+            # cache inside GeminiClient.generate_content, which honors
+            # CACHE_ENABLED and LLM_CACHE_TTL_DAYS.
             try:
                 response = await self.client.generate_content(
                     model_name=self.model_name,
                     user_content=user_content,
                     system_instruction=system_instruction,
                     schema=self.batch_schema,
-                    enable_grounding=False
+                    enable_grounding=False,
+                    # Mapping is schema-constrained list matching; a thinking
+                    # budget adds latency and tokens without better matches.
+                    enable_thinking=False,
+                    # A 20-service mapping table is a few hundred tokens; a
+                    # tight cap stops a runaway decode from dragging out the
+                    # batch tail instead of failing fast.
+                    max_output_tokens=8192,
                 )
                 if response is None or "items" not in response:
                     logger.warning(f"Invalid or None response for batch mapping.")
-                    return [get_fallback(s) for s in services_a_chunk]
+                    return [_fallback_mapping(s) for s in services_a_chunk]
                 return response["items"]
             except Exception as e:
                 logger.error(f"Error matching batch: {e}")
-                return [get_fallback(s) for s in services_a_chunk]
+                return [_fallback_mapping(s) for s in services_a_chunk]
 
-    async def map_services(self, csp_a: str, csp_b: str, services_a: list, services_b: list) -> dict:
+    def _journal_key(self, csp_a: str, csp_b: str) -> str:
+        return f"mapping_{csp_a}_{csp_b}".lower()
+
+    async def map_services_stream(self, csp_a: str, csp_b: str, services_a: list, services_b: list):
         """
-        Maps services from CSP A to CSP B by finding the best match for each service, processing in batches.
+        Streaming variant of map_services: yields each mapping item as soon
+        as it is known — journal replay and cache hits immediately, model
+        results per completed batch — so consumers can overlap downstream
+        work with the batches still in flight.
         """
         if Config.TEST_MODE:
             logger.info("TEST_MODE enabled for ServiceMapper. Returning mock data.")
-            return {
-                "items": [
-                    {
-                        "domain": "Compute",
-                        "csp_a_service_name": "EC2",
-                        "csp_a_url": "https://aws.amazon.com/ec2/",
-                        "csp_b_service_name": "Compute Engine",
-                        "csp_b_url": "https://cloud.google.com/compute/"
-                    },
-                    {
-                        "domain": "Storage",
-                        "csp_a_service_name": "S3",
-                        "csp_a_url": "https://aws.amazon.com/s3/",
-                        "csp_b_service_name": "Cloud Storage",
-                        "csp_b_url": "https://cloud.google.com/storage/"
-                    },
-                    {
-                        "domain": "Database",
-                        "csp_a_service_name": "RDS",
-                        "csp_a_url": "https://aws.amazon.com/rds/",
-                        "csp_b_service_name": ""
-                    },
-                    {
-                        "domain": "Networking",
-                        "csp_a_service_name": "VPC",
-                        "csp_a_url": "https://aws.amazon.com/vpc/",
-                        "csp_b_service_name": "Virtual Private Cloud",
-                        "csp_b_url": "https://cloud.google.com/vpc/"
-                    }
-                ]
-            }
+            for item in _MOCK_MAPPING["items"]:
+                yield item
+            return
 
         logger.info(f"Starting service mapping: {csp_a} -> {csp_b} using {self.model_name}")
 
+        # Resume from the journal of an interrupted run, then serve individual
+        # services from the per-service mapping cache; only the remainder is
+        # sent to the model.
+        journal_key = self._journal_key(csp_a, csp_b)
+        journal_rows = self.response_cache.read_jsonl(journal_key)
+        done_names = {item.get("csp_a_service_name") for item in journal_rows}
+        for item in journal_rows:
+            yield item
+
+        unmapped_services = []
+        for service in services_a:
+            if service.get("service_name") in done_names:
+                continue
+            cached_mapping = self.response_cache.get(self._mapping_key(csp_a, csp_b, service))
+            if cached_mapping:
+                yield cached_mapping
+            else:
+                unmapped_services.append(service)
+
+        if not unmapped_services:
+            return
+
         semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-        batch_size = 20
-        tasks = []
+        services_by_name = {s.get("service_name"): s for s in unmapped_services}
+
+        # The target service list is identical for every batch; serialize
+        # it once per catalog (memoized across calls), minified to the two
+        # fields matching actually needs ("n" = name, "u" = URL) so each
+        # batch prompt carries as few tokens as possible.
+        services_b_json = _slim_services_json(
+            tuple((s.get("service_name"), s.get("service_url")) for s in services_b)
+        )
+
+        def memoize(batch_items):
+            # Journal each finished batch for crash resume and memoize
+            # successful mappings per service
+            self.response_cache.append_jsonl(journal_key, batch_items)
+            for item in batch_items:
+                source = services_by_name.get(item.get("csp_a_service_name"))
+                if source and item.get("csp_b_service_name"):
+                    self.response_cache.set(self._mapping_key(csp_a, csp_b, source), item)
+
+        if Config.BATCH_MODE and self._render_user is not None:
+            # Offline path: submit every chunk as one Vertex
+            # batch-prediction job — half the per-token price and a
+            # single submission in exchange for interactive latency.
+            chunks = [
+                unmapped_services[i:i + BATCH_SIZE]
+                for i in range(0, len(unmapped_services), BATCH_SIZE)
+            ]
+            requests = [
+                (
+                    self._render_user(
+                        csp_a=csp_a,
+                        csp_b=csp_b,
+                        services_a=_slim_chunk_json(chunk),
+                        services_b=services_b_json,
+                    ),
+                    self.system_instruction,
+                    self.batch_schema,
+                )
+                for chunk in chunks
+            ]
+            responses = await self.client.generate_content_batch(self.model_name, requests)
+            for chunk, response in zip(chunks, responses):
+                items = response.get("items") if isinstance(response, dict) else None
+                batch_items = items if items else [_fallback_mapping(s) for s in chunk]
+                memoize(batch_items)
+                for item in batch_items:
+                    yield item
+            return
+
+        # Rolling window instead of one big gather: at most
+        # MAX_CONCURRENT_REQUESTS batch tasks (and their prompt strings)
+        # are alive at a time, and results drain as they complete.
+        pending = set()
+        try:
+            for i in range(0, len(unmapped_services), BATCH_SIZE):
+                if len(pending) >= MAX_CONCURRENT_REQUESTS:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        batch_items = task.result()
+                        memoize(batch_items)
+                        for item in batch_items:
+                            yield item
+                chunk = unmapped_services[i:i + BATCH_SIZE]
+                pending.add(asyncio.ensure_future(
+                    self._map_batch_services(chunk, services_b_json, csp_a, csp_b, semaphore)
+                ))
 
-        for i in range(0, len(services_a), batch_size):
-            chunk = services_a[i:i + batch_size]
-            tasks.append(self._map_batch_services(chunk, services_b, csp_a, csp_b, semaphore))
+            if pending:
+                done, _ = await asyncio.wait(pending)
+                for task in done:
+                    batch_items = task.result()
+                    memoize(batch_items)
+                    for item in batch_items:
+                        yield item
+        except BaseException:
+            # Structured teardown: a fatal error (auth/quota, programming
+            # bug) cancels the sibling batches instead of letting them
+            # keep burning tokens before the failure surfaces. Per-batch
+            # content errors never get here; those already degrade to
+            # fallback entries inside _map_batch_services.
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+            raise
 
-        results = await asyncio.gather(*tasks)
+    async def map_services(self, csp_a: str, csp_b: str, services_a: list, services_b: list) -> dict:
+        """
+        Maps services from CSP A to CSP B by finding the best match for each service, processing in batches.
+        """
+        if Config.TEST_MODE:
+            logger.info("TEST_MODE enabled for ServiceMapper. Returning mock data.")
+            return _MOCK_MAPPING
 
-        # Flatten the list of lists
-        mapped_services = [item for sublist in results for item in sublist]
+        # Collapse duplicate catalog entries (same name and URL) so each
+        # unique service is sent to the model once; duplicates are fanned
+        # back out after mapping.
+        dup_counts = Counter()
+        unique_services = []
+        for service in services_a:
+            key = (service.get("service_name"), service.get("service_url", ""))
+            if key not in dup_counts:
+                unique_services.append(service)
+            dup_counts[key] += 1
+
+        mapped_services = [
+            item
+            async for item in self.map_services_stream(csp_a, csp_b, unique_services, services_b)
+        ]
 
         if not mapped_services:
             logger.warning("Service mapping resulted in empty list.")
             return None
 
+        # The run completed; the journal has served its purpose.
+        self.response_cache.delete_jsonl(self._journal_key(csp_a, csp_b))
+
+        # Fan duplicated inputs back out so callers still see one mapping per
+        # catalog entry.
+        if any(count > 1 for count in dup_counts.values()):
+            expanded = []
+            for item in mapped_services:
+                key = (item.get("csp_a_service_name"), item.get("csp_a_url", ""))
+                expanded.extend([item] * dup_counts.get(key, 1))
+            mapped_services = expanded
+
         return {"items": mapped_services}
+
+    async def map_many(self, pairs: list, concurrency: int = MAX_CONCURRENT_REQUESTS) -> list:
+        """
+        Maps several (csp_a, csp_b, services_a, services_b) tuples concurrently.
+
+        A shared semaphore keeps at most `concurrency` mappings in flight so
+        multi-pair callers overlap their network waits without bursting past
+        the provider quota, and the TaskGroup cancels the siblings as soon as
+        one pair fails instead of letting them keep burning tokens. Results
+        come back in the order the pairs were given.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(pair):
+            async with semaphore:
+                return await self.map_services(*pair)
+
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(one(pair)) for pair in pairs]
+        return [task.result() for task in tasks]
+
+
+@functools.lru_cache(maxsize=1)
+def get_service_mapper() -> ServiceMapper:
+    """Returns the process-wide ServiceMapper.
+
+    Construction loads prompt assets and wires up caches; per-request
+    callers should share one instance (and its response cache and HTTP
+    pool) instead of rebuilding that per call.
+    """
+    return ServiceMapper()
@@ -1,26 +1,155 @@
-import json
+import asyncio
 import logging
+
+import fastjsonschema
+import orjson
 from config import Config
 from constants import MODEL_ANALYSIS, PROMPT_CONFIG_PATH, PRICING_SCHEMA_PATH
-from pipeline.gemini import GeminiClient
+from pipeline.assets import compile_template, load_json
+from pipeline.coalesce import RequestCoalescer
+from pipeline.gemini import get_gemini_client
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Static body of the TEST_MODE response, built once at import; only the
+# service_pair_id varies per call.
+_MOCK_PRICING = {
+    "pricing_models": [
+        {"model_type": "On-Demand", "csp_a_details": "Standard hourly rates", "csp_b_details": "Standard hourly rates"}
+    ],
+    "cost_efficiency_score": 8.0,
+    "pricing_reasoning": "<p>This is a detailed mock pricing narrative for testing purposes. It explains that pricing is relatively similar but one has better spot instance availability.</p>"
+}
+
 class PricingAnalyst:
     def __init__(self):
-        self.client = GeminiClient()
+        self.client = get_gemini_client()
         self.model_name = MODEL_ANALYSIS # Reuse the same model (Pro Thinking)
+        self._coalescer = RequestCoalescer()
         self._load_assets()
 
     def _load_assets(self):
-        with open(PROMPT_CONFIG_PATH, 'r') as f:
-            self.prompts = json.load(f)
+        # load_json memoizes per path, so every analyst instance shares one
+        # parsed copy of the prompt config and schema.
+        prompts = load_json(PROMPT_CONFIG_PATH)
+        self.schema = load_json(PRICING_SCHEMA_PATH)
+
+        # Resolved once so the hot path only formats the template.
+        prompt_config = prompts.get("pricing_prompt", {})
+        self.system_instruction = prompt_config.get("system_instruction")
+        self.user_template = prompt_config.get("user_template", "")
+        self._render_user = compile_template(self.user_template)
+
+        # Compiled (code-generated) validator: checking a response costs
+        # microseconds, so malformed LLM output is caught here instead of
+        # surfacing as a confusing failure in the aggregation step.
+        try:
+            self._validate = fastjsonschema.compile(self.schema) if self.schema else None
+        except Exception as e:
+            logger.warning(f"Could not compile response schema validator: {e}")
+            self._validate = None
+
+        # Multi-pair variant: one request carries several pairs against an
+        # array response schema, paying the system prompt and TTFT once.
+        chunk_config = prompts.get("pricing_chunk_prompt", {})
+        self._chunk_system = chunk_config.get("system_instruction")
+        chunk_template = chunk_config.get("user_template")
+        self._render_chunk = compile_template(chunk_template) if chunk_template else None
+        self._chunk_schema = {"type": "array", "items": self.schema} if self.schema else None
+
+    def _check_schema(self, response: dict, label: str) -> bool:
+        if self._validate is None:
+            return True
+        try:
+            self._validate(response)
+            return True
+        except fastjsonschema.JsonSchemaException as e:
+            logger.error(f"Pricing response for {label} failed schema validation: {e}")
+            return False
+
+    async def perform_analysis(self, csp_a: str, csp_b: str, service_pair: dict, enable_grounding: bool = False) -> dict:
+        # Concurrent duplicates of the same pair share a single in-flight call.
+        # The per-call knobs are part of the key so a grounded request never
+        # receives the result of an overlapping non-grounded one.
+        key = f"{csp_a}_{service_pair.get('csp_a_service_name')}_vs_{csp_b}_{service_pair.get('csp_b_service_name')}_g{int(enable_grounding)}"
+        return await self._coalescer.run(
+            key, lambda: self._perform_analysis(csp_a, csp_b, service_pair, enable_grounding)
+        )
+
+    async def perform_analysis_chunk(self, csp_a: str, csp_b: str, pairs: list, chunk_size: int = 8, enable_grounding: bool = False) -> list:
+        """Analyzes pricing for several service pairs per request.
+
+        Packs up to chunk_size pairs into one call with an array response
+        schema, amortizing the system prompt and time-to-first-token across
+        the chunk. Results align with the input order, mapped back by
+        service_pair_id; pairs a chunk response misses (and whole chunks
+        that fail) fall back to individual calls.
+        """
+        if Config.TEST_MODE or self._render_chunk is None:
+            return [await self.perform_analysis(csp_a, csp_b, pair, enable_grounding) for pair in pairs]
+
+        results = []
+        for start in range(0, len(pairs), chunk_size):
+            chunk = pairs[start:start + chunk_size]
+            rows = [
+                {
+                    "id": f"{pair.get('csp_a_service_name')}_vs_{pair.get('csp_b_service_name')}",
+                    "a": pair.get("csp_a_service_name"),
+                    "b": pair.get("csp_b_service_name"),
+                }
+                for pair in chunk
+                if pair.get("csp_b_service_name")
+            ]
+
+            by_id = {}
+            if rows:
+                user_content = self._render_chunk(
+                    csp_a=csp_a, csp_b=csp_b, pairs=orjson.dumps(rows).decode()
+                )
+                try:
+                    response = await self.client.generate_content(
+                        model_name=self.model_name,
+                        user_content=user_content,
+                        system_instruction=self._chunk_system,
+                        schema=self._chunk_schema,
+                        enable_grounding=enable_grounding,
+                        enable_thinking=False
+                    )
+                except Exception as e:
+                    logger.error(f"Error analyzing pricing chunk: {e}")
+                    response = None
+                for entry in response or []:
+                    if isinstance(entry, dict) and self._check_schema(entry, entry.get("service_pair_id", "?")):
+                        by_id[entry.get("service_pair_id")] = entry
 
-        with open(PRICING_SCHEMA_PATH, 'r') as f:
-            self.schema = json.load(f)
+            for pair in chunk:
+                pair_id = f"{pair.get('csp_a_service_name')}_vs_{pair.get('csp_b_service_name')}"
+                entry = by_id.get(pair_id)
+                if entry is None:
+                    entry = await self.perform_analysis(csp_a, csp_b, pair, enable_grounding)
+                results.append(entry)
+        return results
 
-    async def perform_analysis(self, csp_a: str, csp_b: str, service_pair: dict) -> dict:
+    async def stream_analyses(self, csp_a: str, csp_b: str, pairs: list, enable_grounding: bool = False):
+        """Yields pricing analyses in completion order, not submission order.
+
+        Consumers can write each result out while the remaining calls are
+        still in flight, so peak memory tracks the in-flight window rather
+        than the full run.
+        """
+        tasks = [
+            asyncio.create_task(self.perform_analysis(csp_a, csp_b, pair, enable_grounding))
+            for pair in pairs
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    async def _perform_analysis(self, csp_a: str, csp_b: str, service_pair: dict, enable_grounding: bool = False) -> dict:
         service_a_name = service_pair.get("csp_a_service_name")
         service_b_name = service_pair.get("csp_b_service_name")
 
@@ -30,18 +159,9 @@ class PricingAnalyst:
 
         if Config.TEST_MODE:
             logger.info(f"TEST_MODE enabled for PricingAnalyst. Returning mock data for {service_a_name} vs {service_b_name}")
-            return {
-                "service_pair_id": f"{service_a_name}_vs_{service_b_name}",
-                "pricing_models": [
-                    {"model_type": "On-Demand", "csp_a_details": "Standard hourly rates", "csp_b_details": "Standard hourly rates"}
-                ],
-                "cost_efficiency_score": 8.0,
-                "pricing_reasoning": "<p>This is a detailed mock pricing narrative for testing purposes. It explains that pricing is relatively similar but one has better spot instance availability.</p>"
-            }
-
-        prompt_config = self.prompts["pricing_prompt"]
-        system_instruction = prompt_config["system_instruction"]
-        user_content = prompt_config["user_template"].format(
+            return {"service_pair_id": f"{service_a_name}_vs_{service_b_name}", **_MOCK_PRICING}
+
+        user_content = self._render_user(
             csp_a=csp_a,
             service_a_name=service_a_name,
             csp_b=csp_b,
@@ -52,12 +172,21 @@ class PricingAnalyst:
             response = await self.client.generate_content(
                 model_name=self.model_name,
                 user_content=user_content,
-                system_instruction=system_instruction,
-                schema=self.schema
+                system_instruction=self.system_instruction,
+                schema=self.schema,
+                # Grounding is opt-in: schema-bound pricing answers rarely
+                # need live search, and the attached tool costs an extra
+                # server-side retrieval round even when unused.
+                enable_grounding=enable_grounding,
+                # Pricing extraction is close to a table lookup; a thinking
+                # budget mostly adds latency before the schema-bound answer.
+                enable_thinking=False
             )
             if response is None:
                 logger.error(f"Received None response from GeminiClient for {service_a_name} vs {service_b_name}")
                 return None
+            if not self._check_schema(response, f"{service_a_name} vs {service_b_name}"):
+                return None
             return response
 
         except Exception as e:
@@ -1,34 +1,72 @@
-import json
+import asyncio
 import logging
 import datetime
+
+import fastjsonschema
+import orjson
+
 from config import Config
 from constants import (
     MODEL_SYNTHESIS,
     PROMPT_CONFIG_PATH,
     SYNTHESIS_SCHEMA_PATH,
+    DOMAIN_SUMMARY_SCHEMA_PATH,
     MANAGEMENT_SUMMARY_SCHEMA_PATH,
     OVERARCHING_SUMMARY_SCHEMA_PATH,
 )
-from pipeline.gemini import GeminiClient
+from pipeline.assets import compile_template, load_json
+from pipeline.gemini import get_gemini_client
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class Synthesizer:
     def __init__(self):
-        self.client = GeminiClient()
+        self.client = get_gemini_client()
         self.model_name = MODEL_SYNTHESIS
         self._load_assets()
 
     def _load_assets(self):
-        with open(PROMPT_CONFIG_PATH, "r") as f:
-            self.prompts = json.load(f)
+        # load_json memoizes per path, so every synthesizer instance shares
+        # one parsed copy of the prompt config and schemas.
+        prompts = load_json(PROMPT_CONFIG_PATH)
 
         # Removed SYNTHESIS_SCHEMA_PATH usage as per-pair synthesis is now deterministic concatenation
 
-        with open(MANAGEMENT_SUMMARY_SCHEMA_PATH, "r") as f:
-            self.management_summary_schema = json.load(f)
+        self.management_summary_schema = load_json(MANAGEMENT_SUMMARY_SCHEMA_PATH)
+
+        # Resolved once so the hot path only formats the template.
+        prompt_config = prompts.get("management_summary_prompt", {})
+        self.system_instruction = prompt_config.get("system_instruction")
+        self.user_template = prompt_config.get("user_template", "")
+        # Pre-parsed at load time; rendering is then pure concatenation.
+        self._render_user = compile_template(self.user_template)
+
+        # Compiled (code-generated) validator, mirroring the analysts: a
+        # malformed summary is rejected here in microseconds instead of
+        # breaking the dashboard render later.
+        try:
+            self._validate = (
+                fastjsonschema.compile(self.management_summary_schema)
+                if self.management_summary_schema else None
+            )
+        except Exception as e:
+            logger.warning(f"Could not compile management summary validator: {e}")
+            self._validate = None
+
+        # Split-summary prompts: domains are summarized in parallel and the
+        # overarching narrative is distilled from those summaries, so total
+        # latency tracks the slowest domain instead of one long decode.
+        self.domain_summary_schema = load_json(DOMAIN_SUMMARY_SCHEMA_PATH)
+        self.overarching_summary_schema = load_json(OVERARCHING_SUMMARY_SCHEMA_PATH)
+        domain_config = prompts.get("domain_summary_prompt", {})
+        self._domain_system = domain_config.get("system_instruction")
+        domain_template = domain_config.get("user_template")
+        self._render_domain = compile_template(domain_template) if domain_template else None
+        overarching_config = prompts.get("overarching_summary_prompt", {})
+        self._overarching_system = overarching_config.get("system_instruction")
+        overarching_template = overarching_config.get("user_template")
+        self._render_overarching = compile_template(overarching_template) if overarching_template else None
 
     async def generate_management_summary(self, synthesis_by_domain: dict) -> dict:
         if not synthesis_by_domain:
@@ -44,13 +82,17 @@ class Synthesizer:
                 },
             }
 
-        prompt_config = self.prompts["management_summary_prompt"]
-        system_instruction = prompt_config["system_instruction"]
-        synthesis_str = json.dumps(synthesis_by_domain)
+        if self._render_domain is not None and self._render_overarching is not None:
+            summary = await self._generate_split_summary(synthesis_by_domain)
+            if summary is not None:
+                return summary
+            logger.warning("Split summary generation failed; falling back to single-call summary.")
 
-        user_content = prompt_config["user_template"].format(
-            synthesis_json=synthesis_str
-        )
+        system_instruction = self.system_instruction
+        # orjson: the domain payload can be hundreds of KB of narratives.
+        synthesis_str = orjson.dumps(synthesis_by_domain).decode()
+
+        user_content = self._render_user(synthesis_json=synthesis_str)
 
         try:
             response = await self.client.generate_content(
@@ -63,12 +105,77 @@ class Synthesizer:
             if response is None:
                 logger.error("Received None response from GeminiClient for management summary")
                 return None
+            if self._validate is not None:
+                try:
+                    self._validate(response)
+                except fastjsonschema.JsonSchemaException as e:
+                    logger.error(f"Management summary failed schema validation: {e}")
+                    return None
             return response
 
         except Exception as e:
             logger.error(f"Error generating management summary: {e}")
             return None
 
+    async def _summarize_domain(self, domain: str, results: list) -> str:
+        """Summarizes one domain; returns the summary string or None."""
+        try:
+            response = await self.client.generate_content(
+                model_name=self.model_name,
+                user_content=self._render_domain(
+                    domain=domain, synthesis_json=orjson.dumps(results).decode()
+                ),
+                system_instruction=self._domain_system,
+                schema=self.domain_summary_schema,
+                enable_grounding=False,
+            )
+        except Exception as e:
+            logger.error(f"Error summarizing domain {domain}: {e}")
+            return None
+        return (response or {}).get("domain_summary")
+
+    async def _generate_split_summary(self, synthesis_by_domain: dict) -> dict:
+        """Parallel per-domain summaries plus one overarching distillation.
+
+        Each domain is an independent call, so wall time is the slowest
+        domain rather than one long serial decode over all of them; the
+        overarching call then reads only the short summaries. In-flight
+        concurrency stays bounded by the client's process-wide gate.
+        Returns None when any piece fails so the caller can fall back.
+        """
+        domains = list(synthesis_by_domain.items())
+        summaries = await asyncio.gather(
+            *(self._summarize_domain(domain, results) for domain, results in domains)
+        )
+        domain_summaries = {
+            domain: summary
+            for (domain, _), summary in zip(domains, summaries)
+            if summary
+        }
+        if len(domain_summaries) != len(domains):
+            return None
+
+        try:
+            response = await self.client.generate_content(
+                model_name=self.model_name,
+                user_content=self._render_overarching(
+                    domain_summaries_json=orjson.dumps(domain_summaries).decode()
+                ),
+                system_instruction=self._overarching_system,
+                schema=self.overarching_summary_schema,
+                enable_grounding=False,
+            )
+        except Exception as e:
+            logger.error(f"Error generating overarching summary: {e}")
+            return None
+        overarching = (response or {}).get("overarching_summary")
+        if not overarching:
+            return None
+        return {
+            "overarching_summary": overarching,
+            "domain_summaries": domain_summaries,
+        }
+
     async def synthesize(
         self, service_pair_id: str, technical_data: dict, pricing_data: dict
     ) -> dict:
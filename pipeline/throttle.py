@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+
+class Throttler:
+    """Token-bucket rate limiter used as an async context manager.
+
+    The concurrency semaphore caps how many requests are in flight; this
+    caps how many start per second, smoothing out the bursts that occur
+    when warm cache entries let many coroutines reach the API at once.
+
+    Allows bursts of up to `burst` requests, then refills at `rate` tokens
+    per second. No lock is needed: the bookkeeping between awaits is atomic
+    on a single event loop, and sleeps happen outside any shared state so
+    waiters are not serialized.
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class RateLimiter(Throttler):
+    """Dual token bucket: requests per second plus tokens per minute.
+
+    Vertex enforces both a request-rate and a token-throughput quota;
+    staying proactively under both avoids 429s and the retry backoff they
+    trigger. Callers estimate the token cost of a request up front and
+    wait until both buckets have capacity.
+    """
+
+    def __init__(self, rate: float, tokens_per_minute: float, burst: int = None):
+        super().__init__(rate, burst)
+        self.token_rate = tokens_per_minute / 60.0
+        self._token_capacity = float(tokens_per_minute)
+        self._token_budget = self._token_capacity
+        self._token_updated = time.monotonic()
+
+    async def acquire(self, estimated_tokens: int = 0):
+        await super().acquire()
+        if not estimated_tokens:
+            return
+        while True:
+            now = time.monotonic()
+            self._token_budget = min(
+                self._token_capacity,
+                self._token_budget + (now - self._token_updated) * self.token_rate,
+            )
+            self._token_updated = now
+            if self._token_budget >= estimated_tokens:
+                self._token_budget -= estimated_tokens
+                return
+            await asyncio.sleep((estimated_tokens - self._token_budget) / self.token_rate)
@@ -1,19 +1,37 @@
+import collections
+import functools
 import os
-import json
 import logging
 import datetime
 import markdown
-from jinja2 import Environment, FileSystemLoader
+import orjson
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from constants import TEMPLATE_PATH
+from pipeline.sovereignty_analyst import enrich_controls
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@functools.lru_cache(maxsize=1)
+def _get_template_env(template_dir):
+    """One shared Environment per process.
+
+    auto_reload is off (the template never changes mid-run, so skip the
+    mtime stat per lookup) and compiled template bytecode is cached on
+    disk, so later runs skip the compile entirely.
+    """
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        auto_reload=False,
+        bytecode_cache=FileSystemBytecodeCache(),
+    )
+
+
 class DashboardGenerator:
     def __init__(self):
         template_dir = os.path.dirname(TEMPLATE_PATH)
         template_name = os.path.basename(TEMPLATE_PATH)
-        self.env = Environment(loader=FileSystemLoader(template_dir))
+        self.env = _get_template_env(template_dir)
         self.template = self.env.get_template(template_name)
 
     def generate_dashboard(
@@ -42,58 +60,45 @@ class DashboardGenerator:
         total_compared = len(results)
         total_services_csp_a = len(service_maps)
 
-        tech_scores = (
-            [r["result"]["technical_data"]["technical_score"] for r in results]
-            if results
-            else []
-        )
-        price_scores = (
-            [r["result"]["pricing_data"]["cost_efficiency_score"] for r in results]
-            if results
-            else []
-        )
-        lockin_scores = (
-            [r["result"]["technical_data"]["lockin_analysis"]["lockin_score"] for r in results]
-            if results
-            else []
-        )
+        # Single pass over the results: global score totals, the domain
+        # grouping and the per-domain sums all come out of one traversal
+        # instead of separate comprehensions and loops per statistic.
+        tech_total = price_total = lockin_total = 0
+        services_by_domain = collections.defaultdict(list)
+        domain_sums = collections.defaultdict(lambda: [0, 0, 0])
 
-        avg_technical = sum(tech_scores) / total_compared if total_compared else 0
-        avg_price = sum(price_scores) / total_compared if total_compared else 0
-        avg_lockin = sum(lockin_scores) / total_compared if total_compared else 0
+        for item in results:
+            technical_data = item["result"]["technical_data"]
+            tech = technical_data["technical_score"]
+            price = item["result"]["pricing_data"]["cost_efficiency_score"]
+            lockin = technical_data["lockin_analysis"]["lockin_score"]
 
-        # Group by Domain
-        services_by_domain = {}
-        domain_scores = {}
-        domain_scores_tech = {}
-        domain_scores_cost = {}
-        domain_scores_lockin = {}
+            tech_total += tech
+            price_total += price
+            lockin_total += lockin
 
-        for item in results:
             domain = item["map"].get("domain", "Uncategorized")
-            if domain not in services_by_domain:
-                services_by_domain[domain] = []
             services_by_domain[domain].append(item)
+            sums = domain_sums[domain]
+            sums[0] += tech
+            sums[1] += price
+            sums[2] += lockin
+
+        avg_technical = tech_total / total_compared if total_compared else 0
+        avg_price = price_total / total_compared if total_compared else 0
+        avg_lockin = lockin_total / total_compared if total_compared else 0
 
-        # Calculate domain averages for table display and chart
-        for domain, items in services_by_domain.items():
-            count = len(items)
-            d_tech = sum(
-                [i["result"]["technical_data"]["technical_score"] for i in items]
-            )
-            d_price = sum(
-                [i["result"]["pricing_data"]["cost_efficiency_score"] for i in items]
-            )
-            d_lockin = sum(
-                [i["result"]["technical_data"]["lockin_analysis"]["lockin_score"] for i in items]
-            )
-
-            avg_combined = (d_tech + d_price) / (2 * count) if count > 0 else 0
-            domain_scores[domain] = round(avg_combined, 2)
-
-            domain_scores_tech[domain] = round(d_tech / count, 2) if count > 0 else 0
-            domain_scores_cost[domain] = round(d_price / count, 2) if count > 0 else 0
-            domain_scores_lockin[domain] = round(d_lockin / count, 2) if count > 0 else 0
+        # Derive domain averages for table display and chart
+        domain_scores = {}
+        domain_scores_tech = {}
+        domain_scores_cost = {}
+        domain_scores_lockin = {}
+        for domain, (d_tech, d_price, d_lockin) in domain_sums.items():
+            count = len(services_by_domain[domain])
+            domain_scores[domain] = round((d_tech + d_price) / (2 * count), 2)
+            domain_scores_tech[domain] = round(d_tech / count, 2)
+            domain_scores_cost[domain] = round(d_price / count, 2)
+            domain_scores_lockin[domain] = round(d_lockin / count, 2)
 
         # Prepare data for Chart.js spider web graph
         chart_labels = list(services_by_domain.keys())
@@ -102,11 +107,11 @@ class DashboardGenerator:
         chart_lockin_data = [domain_scores_lockin[d] for d in chart_labels]
 
         domain_scores_chart_data = {
-            "labels": json.dumps(chart_labels),
+            "labels": orjson.dumps(chart_labels).decode(),
             "datasets": [
                 {
                     "label": f"Technical Score ({csp_b} vs {csp_a})",
-                    "data": json.dumps(chart_tech_data),
+                    "data": orjson.dumps(chart_tech_data).decode(),
                     "fill": True,
                     "backgroundColor": "rgba(54, 162, 235, 0.2)",
                     "borderColor": "rgb(54, 162, 235)",
@@ -114,7 +119,7 @@ class DashboardGenerator:
                 },
                 {
                     "label": f"Cost Efficiency ({csp_b} vs {csp_a})",
-                    "data": json.dumps(chart_cost_data),
+                    "data": orjson.dumps(chart_cost_data).decode(),
                     "fill": True,
                     "backgroundColor": "rgba(255, 99, 132, 0.2)",
                     "borderColor": "rgb(255, 99, 132)",
@@ -122,7 +127,7 @@ class DashboardGenerator:
                 },
                 {
                     "label": f"LockIn Score ({csp_b} vs {csp_a})",
-                    "data": json.dumps(chart_lockin_data),
+                    "data": orjson.dumps(chart_lockin_data).decode(),
                     "fill": True,
                     "backgroundColor": "rgba(255, 205, 86, 0.2)",
                     "borderColor": "rgb(255, 205, 86)",
@@ -146,14 +151,15 @@ class DashboardGenerator:
         sov_chart_data = None
         sov_comparison = []
         if sov_data_a and sov_data_b:
-            # Create a lookup for CSP B controls by ID to ensure alignment
-            dict_b = {c["control_id"]: c for c in sov_data_b.get("controls", [])}
+            # Create a lookup for CSP B controls by ID to ensure alignment;
+            # enrichment splices the canonical control text in at render time.
+            dict_b = {c["control_id"]: c for c in enrich_controls(sov_data_b)}
             
             sov_labels = []
             sov_a_scores = []
             sov_b_scores = []
 
-            for ctrl_a in sov_data_a.get("controls", []):
+            for ctrl_a in enrich_controls(sov_data_a):
                 cid = ctrl_a["control_id"]
                 ctrl_b = dict_b.get(cid)
                 
@@ -164,11 +170,11 @@ class DashboardGenerator:
                 sov_comparison.append({"a": ctrl_a, "b": ctrl_b})
 
             sov_chart_data = {
-                "labels": json.dumps(sov_labels),
+                "labels": orjson.dumps(sov_labels).decode(),
                 "datasets": [
                     {
                         "label": f"{csp_a} Sovereignty",
-                        "data": json.dumps(sov_a_scores),
+                        "data": orjson.dumps(sov_a_scores).decode(),
                         "fill": True,
                         "backgroundColor": "rgba(75, 192, 192, 0.2)",
                         "borderColor": "rgb(75, 192, 192)",
@@ -176,7 +182,7 @@ class DashboardGenerator:
                     },
                     {
                         "label": f"{csp_b} Sovereignty",
-                        "data": json.dumps(sov_b_scores),
+                        "data": orjson.dumps(sov_b_scores).decode(),
                         "fill": True,
                         "backgroundColor": "rgba(153, 102, 255, 0.2)",
                         "borderColor": "rgb(153, 102, 255)",
@@ -185,8 +191,9 @@ class DashboardGenerator:
                 ]
             }
 
-        # Render final HTML
-        html_content = self.template.render(
+        # Render final HTML, streaming blocks into a buffered handle instead
+        # of materializing the whole document as one string first.
+        stream = self.template.stream(
             csp_a=csp_a,
             csp_b=csp_b,
             generated_at=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -197,7 +204,8 @@ class DashboardGenerator:
             avg_technical_score=round(avg_technical, 2),
             avg_cost_score=round(avg_price, 2),
             avg_lockin_score=round(avg_lockin, 2),
-            services_by_domain=services_by_domain,
+            # Plain dict so a stray template lookup can't grow the mapping.
+            services_by_domain=dict(services_by_domain),
             domain_scores=domain_scores,
             domain_scores_chart_data=domain_scores_chart_data,
             missing_services=missing_services_list,
@@ -207,7 +215,10 @@ class DashboardGenerator:
             sov_chart_data=sov_chart_data,
         )
 
-        with open(output_path, 'w') as f:
-            f.write(html_content)
+        # Batch template events so dump() issues a few large writes rather
+        # than one per rendered block.
+        stream.enable_buffering(64)
+        with open(output_path, 'w', buffering=1 << 18) as f:
+            stream.dump(f)
 
         logger.info(f"Dashboard generated at {output_path}")
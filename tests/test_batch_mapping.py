@@ -2,10 +2,18 @@ import unittest
 from unittest.mock import patch, MagicMock, AsyncMock
 import json
 import asyncio
+import tempfile
+from pipeline.assets import load_json
+from pipeline.cache import CacheManager
 from pipeline.discovery import ServiceMapper
 
 class TestBatchMapping(unittest.IsolatedAsyncioTestCase):
 
+    def setUp(self):
+        # Asset loads are memoized process-wide; reset between tests so each
+        # one sees its own mocked file contents.
+        load_json.cache_clear()
+
     @patch("builtins.open")
     @patch("pipeline.discovery.GeminiClient")
     async def test_map_services_batching(self, MockGeminiClient, mock_open):
@@ -106,5 +114,44 @@ class TestBatchMapping(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(result["items"][0]["csp_a_service_name"], "Service A 0")
             self.assertIsNone(result["items"][0]["csp_b_service_name"])
 
+    @patch("pipeline.discovery.GeminiClient")
+    async def test_map_services_stream_resumes_from_journal(self, MockGeminiClient):
+        """Journaled rows replay first and only the remainder hits the model."""
+        journaled_row = {"csp_a_service_name": "Svc 0", "csp_b_service_name": "Done"}
+        fresh_row = {"csp_a_service_name": "Svc 1", "csp_b_service_name": "Fresh"}
+
+        mock_client_instance = MockGeminiClient.return_value
+        mock_client_instance.generate_content = AsyncMock(
+            return_value={"items": [fresh_row]}
+        )
+
+        with tempfile.TemporaryDirectory() as tmp, \
+             patch('pipeline.discovery.Config.TEST_MODE', False):
+            mapper = ServiceMapper()
+            # Real prompt assets, but the journal and mapping cache live in a
+            # throwaway directory.
+            mapper.response_cache = CacheManager(cache_dir=tmp)
+            mapper.response_cache.append_jsonl(
+                mapper._journal_key("CSP_A", "CSP_B"), [journaled_row]
+            )
+
+            services_a = [{"service_name": "Svc 0"}, {"service_name": "Svc 1"}]
+            items = [
+                item
+                async for item in mapper.map_services_stream("CSP_A", "CSP_B", services_a, [])
+            ]
+
+            # The journaled service replays without a model call; the one
+            # unmapped service goes out as a single batch.
+            self.assertEqual(items, [journaled_row, fresh_row])
+            mock_client_instance.generate_content.assert_called_once()
+
+            # The fresh batch was journaled too, so a second interrupted run
+            # would resume with both rows.
+            self.assertEqual(
+                mapper.response_cache.read_jsonl(mapper._journal_key("CSP_A", "CSP_B")),
+                [journaled_row, fresh_row],
+            )
+
 if __name__ == '__main__':
     unittest.main()
@@ -2,6 +2,7 @@ import unittest
 import asyncio
 import json
 import os
+import tempfile
 import time
 from unittest.mock import MagicMock, AsyncMock, patch, mock_open
 
@@ -24,8 +25,7 @@ class TestCacheManager(unittest.TestCase):
         cache = CacheManager()
         content = json.dumps({"data": "cached"})
 
-        with patch("os.path.exists", return_value=True), \
-             patch("os.path.getmtime", return_value=time.time()), \
+        with patch("os.stat", return_value=MagicMock(st_mtime=time.time())), \
              patch("builtins.open", mock_open(read_data=content)):
 
             result = cache.get("some_key")
@@ -36,8 +36,7 @@ class TestCacheManager(unittest.TestCase):
         cache = CacheManager(max_age_days=7)
         old_time = time.time() - (8 * 24 * 3600) # 8 days ago
 
-        with patch("os.path.exists", return_value=True), \
-             patch("os.path.getmtime", return_value=old_time):
+        with patch("os.stat", return_value=MagicMock(st_mtime=old_time)):
 
             result = cache.get("some_key")
             self.assertIsNone(result)
@@ -46,8 +45,7 @@ class TestCacheManager(unittest.TestCase):
         """Test that corrupt JSON data is handled."""
         cache = CacheManager()
 
-        with patch("os.path.exists", return_value=True), \
-             patch("os.path.getmtime", return_value=time.time()), \
+        with patch("os.stat", return_value=MagicMock(st_mtime=time.time())), \
              patch("builtins.open", mock_open(read_data="{invalid json")):
 
             result = cache.get("some_key")
@@ -58,8 +56,7 @@ class TestCacheManager(unittest.TestCase):
         cache = CacheManager()
 
         # Test with empty dict
-        with patch("os.path.exists", return_value=True), \
-             patch("os.path.getmtime", return_value=time.time()), \
+        with patch("os.stat", return_value=MagicMock(st_mtime=time.time())), \
              patch("builtins.open", mock_open(read_data="{}")):
 
             result = cache.get("some_key")
@@ -69,12 +66,17 @@ class TestCacheManager(unittest.TestCase):
         """Test setting valid data to cache."""
         cache = CacheManager()
 
+        filepath = os.path.join("data", "my_key.json")
         with patch("builtins.open", mock_open()) as mocked_file, \
-             patch("json.dump") as mock_json_dump:
+             patch("pipeline.cache.orjson.dumps", return_value=b"{}") as mock_dumps, \
+             patch("pipeline.cache.os.replace") as mock_replace:
 
             cache.set("my_key", {"data": "is_good"})
-            mocked_file.assert_called_once_with(os.path.join("data", "my_key.json"), "w")
-            mock_json_dump.assert_called_once()
+            # Writes go to a sidecar file that is atomically renamed into place.
+            mocked_file.assert_called_once_with(filepath + ".tmp", "wb")
+            mock_dumps.assert_called_once()
+            mocked_file().write.assert_called_once_with(b"{}")
+            mock_replace.assert_called_once_with(filepath + ".tmp", filepath)
 
     def test_set_invalid_data(self):
         """Test that invalid data is not written to cache."""
@@ -87,6 +89,84 @@ class TestCacheManager(unittest.TestCase):
             cache.set("my_key", [])
             mocked_file.assert_not_called()
 
+class TestCacheManagerOnDisk(unittest.TestCase):
+    """Behavior tests against a real temporary cache directory."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = CacheManager(cache_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_many_returns_only_hits(self):
+        """Batched lookup returns hits keyed by cache key, omitting misses."""
+        self.cache.set("hit_a", {"a": 1})
+        self.cache.set("hit_b", {"b": 2})
+
+        hits = self.cache.get_many(["hit_a", "missing", "hit_b"])
+        self.assertEqual(hits, {"hit_a": {"a": 1}, "hit_b": {"b": 2}})
+
+    def test_journal_append_read_delete(self):
+        """Appended journal rows replay in order until the journal is deleted."""
+        rows = [{"csp_a_service_name": "EC2"}, {"csp_a_service_name": "S3"}]
+        self.cache.append_jsonl("journal_key", rows[:1])
+        self.cache.append_jsonl("journal_key", rows[1:])
+
+        self.assertEqual(self.cache.read_jsonl("journal_key"), rows)
+
+        self.cache.delete_jsonl("journal_key")
+        self.assertEqual(self.cache.read_jsonl("journal_key"), [])
+
+    def test_journal_stale_is_ignored(self):
+        """A journal older than max age replays nothing."""
+        self.cache.append_jsonl("journal_key", [{"csp_a_service_name": "EC2"}])
+        old_time = time.time() - (8 * 24 * 3600)  # 8 days ago
+        os.utime(self.cache._get_jsonl_path("journal_key"), (old_time, old_time))
+
+        self.assertEqual(self.cache.read_jsonl("journal_key"), [])
+
+    def test_clear_removes_only_cache_files(self):
+        """clear() unlinks .json/.jsonl entries but leaves other files alone."""
+        self.cache.set("entry", {"a": 1})
+        self.cache.append_jsonl("journal_key", [{"a": 1}])
+        bystander = os.path.join(self.tmp.name, "keep.txt")
+        with open(bystander, "w") as f:
+            f.write("not a cache file")
+
+        self.cache.clear()
+
+        self.assertIsNone(self.cache.get("entry"))
+        self.assertEqual(self.cache.read_jsonl("journal_key"), [])
+        self.assertTrue(os.path.exists(bystander))
+
+
+class TestCacheFlusher(unittest.IsolatedAsyncioTestCase):
+
+    async def test_set_async_flushes_on_close(self):
+        """Queued writes land on disk once aclose() drains the flusher."""
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = CacheManager(cache_dir=tmp)
+            cache.set_async("flushed_key", {"data": "queued"})
+            await cache.aclose()
+
+            # A fresh manager proves the entry is on disk, not just in the
+            # writer's in-process LRU.
+            self.assertEqual(
+                CacheManager(cache_dir=tmp).get("flushed_key"), {"data": "queued"}
+            )
+            self.assertIsNone(cache._flusher)
+
+    def test_set_async_without_loop_writes_synchronously(self):
+        """Outside an event loop, set_async degrades to a blocking set()."""
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = CacheManager(cache_dir=tmp)
+            cache.set_async("sync_key", {"data": "direct"})
+            self.assertEqual(
+                CacheManager(cache_dir=tmp).get("sync_key"), {"data": "direct"}
+            )
+
+
 class TestPipelineCachingBehavior(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
@@ -106,13 +186,9 @@ class TestPipelineCachingBehavior(unittest.IsolatedAsyncioTestCase):
         Optimization Verification:
         If cache is fresh, analysts should NOT be called.
         """
-        # Setup mock CacheManager
+        # Setup mock CacheManager: every key hits
         mock_cache = MagicMock(spec=CacheManager)
-        mock_cache.get.side_effect = [
-            {"tech": "cached"},
-            {"pricing": "cached"},
-            {"result": "cached"}
-        ]
+        mock_cache.get_many.side_effect = lambda keys: {k: {"cached": "data"} for k in keys}
 
         await process_service_item(
             MOCK_ITEM,
@@ -131,7 +207,7 @@ class TestPipelineCachingBehavior(unittest.IsolatedAsyncioTestCase):
         self.pricing_analyst.perform_analysis.assert_not_called()
         self.synthesizer.synthesize.assert_not_called()
         # Cache should not be written to
-        mock_cache.set.assert_not_called()
+        mock_cache.set_async.assert_not_called()
 
     async def test_process_service_item_no_cache(self):
         """
@@ -140,7 +216,7 @@ class TestPipelineCachingBehavior(unittest.IsolatedAsyncioTestCase):
         """
         # Setup mock CacheManager to return nothing
         mock_cache = MagicMock(spec=CacheManager)
-        mock_cache.get.return_value = None
+        mock_cache.get_many.return_value = {}
 
         await process_service_item(
             MOCK_ITEM,
@@ -160,7 +236,7 @@ class TestPipelineCachingBehavior(unittest.IsolatedAsyncioTestCase):
         self.synthesizer.synthesize.assert_called_once()
 
         # Cache should be written to 3 times (tech, pricing, synth)
-        self.assertEqual(mock_cache.set.call_count, 3)
+        self.assertEqual(mock_cache.set_async.call_count, 3)
 
 if __name__ == "__main__":
     unittest.main()
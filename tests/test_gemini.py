@@ -17,7 +17,8 @@ class TestGeminiClientWithTestMode(unittest.IsolatedAsyncioTestCase):
         client.client.models.generate_content.assert_called_once()
 
     @patch('pipeline.gemini.Config.TEST_MODE', True)
-    async def test_generate_content_retry_on_api_error(self):
+    @patch('pipeline.gemini.asyncio.sleep', new_callable=AsyncMock)
+    async def test_generate_content_retry_on_api_error(self, mock_sleep):
         client = GeminiClient()
         client.client.models.generate_content.side_effect = errors.APIError(500, {}, None)
 
@@ -26,7 +27,8 @@ class TestGeminiClientWithTestMode(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(client.client.models.generate_content.call_count, 3)
 
     @patch('pipeline.gemini.Config.TEST_MODE', True)
-    async def test_generate_content_retry_on_value_error(self):
+    @patch('pipeline.gemini.asyncio.sleep', new_callable=AsyncMock)
+    async def test_generate_content_retry_on_value_error(self, mock_sleep):
         client = GeminiClient()
         client.client.models.generate_content.side_effect = ValueError("Validation failed")
 
@@ -35,7 +37,8 @@ class TestGeminiClientWithTestMode(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(client.client.models.generate_content.call_count, 3)
 
     @patch('pipeline.gemini.Config.TEST_MODE', True)
-    async def test_generate_content_retry_on_json_error(self):
+    @patch('pipeline.gemini.asyncio.sleep', new_callable=AsyncMock)
+    async def test_generate_content_retry_on_json_error(self, mock_sleep):
         client = GeminiClient()
         client.client.models.generate_content.side_effect = json.JSONDecodeError("msg", "doc", 0)
 
@@ -44,7 +47,8 @@ class TestGeminiClientWithTestMode(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(client.client.models.generate_content.call_count, 3)
 
     @patch('pipeline.gemini.Config.TEST_MODE', True)
-    async def test_generate_content_success_after_retry(self):
+    @patch('pipeline.gemini.asyncio.sleep', new_callable=AsyncMock)
+    async def test_generate_content_success_after_retry(self, mock_sleep):
         client = GeminiClient()
         mock_successful_response = MagicMock()
         mock_successful_response.parsed = {"result": "success"}
@@ -3,6 +3,7 @@ from unittest.mock import patch, MagicMock, AsyncMock, mock_open
 import json
 import os
 import asyncio
+from pipeline.assets import load_json
 from pipeline.discovery import ServiceMapper
 from pipeline.sovereignty_analyst import SovereigntyAnalyst
 from pipeline.analyzer import TechnicalAnalyst
@@ -45,6 +46,11 @@ expected_synthesis = {
 }
 
 class TestPipeline(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # Asset loads are memoized process-wide; reset between tests so each
+        # one sees its own mocked file contents.
+        load_json.cache_clear()
+
     @patch("builtins.open")
     async def test_discovery(self, mock_open_func):
         # Configure the mock to return valid JSON for calls to load assets
@@ -165,15 +171,15 @@ class TestPipeline(unittest.IsolatedAsyncioTestCase):
         csp_a2, csp_b2 = "Azure", "GCP"
 
         # Simulate cache misses for both
-        cache.get.return_value = None
+        cache.get_many.return_value = {}
 
         # Process both items
         await process_service_item(item1, tech_analyst, pricing_analyst, synthesizer, csp_a1, csp_b1, cache, semaphore)
         await process_service_item(item2, tech_analyst, pricing_analyst, synthesizer, csp_a2, csp_b2, cache, semaphore)
 
         # Get the keys used for caching
-        tech_key1_call = cache.set.call_args_list[0][0][0]
-        tech_key2_call = cache.set.call_args_list[3][0][0] # 3 because each process_service_item calls cache.set 3 times
+        tech_key1_call = cache.set_async.call_args_list[0][0][0]
+        tech_key2_call = cache.set_async.call_args_list[3][0][0] # 3 because each process_service_item calls cache.set_async 3 times
 
         # Assert that the keys are different
         self.assertNotEqual(tech_key1_call, tech_key2_call, "Cache keys for services with the same name but different CSPs should be different.")